@@ -170,3 +170,19 @@ class RawLogFile(BaseModel):
 
 def parse_Json(dictionary: dict) -> RawLogFile:
     return RawLogFile.parse_obj(dictionary)
+
+
+class CommonEventsDelta(BaseModel):
+    ProtocolStart: Optional[Timestamp] = None
+    ProtocolPaused: list = []
+    ProtocolAborted: Optional[dict] = None
+    ProtocolFinished: Optional[Timestamp] = None
+    RegisterScore: list[Score] = []
+    IrcComputeDifficulty: list['IrcComputeDifficulty'] = []
+
+
+class SessionDelta(BaseModel):
+    CommonEvents: CommonEventsDelta = CommonEventsDelta()
+    ObjectEvents: dict[str, list[ObjectEvent]] = {}
+    TrackingRaw: dict[str, Positions] = {}
+    Kinematics: dict[str, Positions] = {}
@@ -1,16 +1,23 @@
 import json
+import os
 import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Annotated, List
+from typing import Annotated
 from typing import Optional
 
 import uvicorn
 from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi import Request, Path, UploadFile, File
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi import Request, Path
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, FileResponse, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import PlainTextResponse
 from jose import JWTError, jwt
+from pydantic import ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
 from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -20,13 +27,36 @@ import database
 from InternalCode.Application.useCApp import sum_of_numbers
 
 # Import custom JSON parser
-from InternalCode.json_parser import parse_Json
+from InternalCode.json_parser import parse_Json, SessionDelta
+
+# Import session storage and incremental appends
+from session_store import (append_to_session, check_session_access, load_session, load_session_columns,
+                           store_session)
+
+# Import binary columnar export of sessions
+import session_export
+
+# Import the on-demand request profiler
+import request_profiler
+
+# Import per-route concurrency bulkheads
+from bulkhead import Bulkheads
 
 # Import Pydantic models for API validation and serialization
-from pydanticApiModels import Item, User, Token, TokenData
+from pydanticApiModels import Item, User, Token, TokenData, RefreshRequest
+
+# Import refresh token revocation
+from token_revocation import is_token_revoked, revoke_token
+
+# Import memory-budget admission control for uploads
+from upload_admission import UploadMemoryBudget
+
+# Import buffered background logging
+from logging_setup import log_access, setup_logging, shutdown_logging
 
 # Import slowapi for Rate Limiting
 from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from slowapi.middleware import SlowAPIMiddleware
 
@@ -41,6 +71,65 @@ ALGORITHM = "HS256"
 # Expiration time (in minutes) for JWT tokens
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Expiration time (in days) for refresh tokens
+REFRESH_TOKEN_EXPIRE_DAYS = 30
+
+# Memory (in MB) that in-flight upload parses may hold per worker
+UPLOAD_MEMORY_BUDGET_MB = 1024
+
+# Estimated parse memory per uploaded byte (json.load plus parse_Json object trees)
+UPLOAD_EXPANSION_FACTOR = 6.0
+
+# Number of uploads that may wait for memory budget, and how long (in seconds) they may wait.
+# Uploads pass the "bulk" bulkhead first (see BULKHEAD_LIMITS), so at most its max_concurrent - 1
+# uploads can ever wait here; further uploads wait in the bulkhead's queue.
+UPLOAD_QUEUE_SIZE = 1
+UPLOAD_QUEUE_TIMEOUT = 10.0
+
+# Seconds a client is asked to wait before retrying a rejected upload
+UPLOAD_RETRY_AFTER = 5
+
+# Application log file, e.g. '<path_to_log_dir>/app_log'. None writes to stderr.
+LOG_FILE = None
+
+# Root log level and per-module overrides
+LOG_LEVEL = "INFO"
+LOG_MODULE_LEVELS = {
+    "sqlalchemy.engine": "WARNING",
+    "uvicorn.access": "WARNING",
+}
+
+# Write structured JSON lines instead of plain text
+LOG_JSON = True
+
+# Fraction of access records kept per route path prefix
+LOG_SAMPLING = {
+    "/items/": 0.01,
+    "/users/me/": 0.1,
+}
+
+# Usernames allowed to profile requests and read the saved profiles
+ADMIN_USERS = set()
+
+# Directory the request profiles are saved in, shared by all workers
+PROFILE_DIR = "profiles"
+
+# Default and maximum sampling rate (samples per second) of the request profiler
+PROFILE_DEFAULT_RATE = 200.0
+PROFILE_MAX_RATE = 1000.0
+
+# Per-route concurrency limits (per worker), applied with @bulkheads.limit(<name>).
+# Requests beyond max_concurrent wait in a queue of max_queue for up to queue_timeout seconds,
+# otherwise they are rejected with 503 and Retry-After.
+# "bulk" is entered before the upload memory budget: it bounds how many uploads (and session
+# reads, exports and sums) run at once, and the budget then only holds back those of them
+# whose parses do not fit in memory together. An upload may therefore wait up to
+# queue_timeout + UPLOAD_QUEUE_TIMEOUT seconds in total.
+BULKHEAD_LIMITS = {
+    "bulk": {"max_concurrent": 2, "max_queue": 8, "queue_timeout": 10.0, "retry_after": 5},
+    "sync": {"max_concurrent": 8, "max_queue": 32, "queue_timeout": 2.0, "retry_after": 1},
+}
+
 # CryptContext instance for hashing passwords
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -57,7 +146,19 @@ app.state.limiter = limiter
 # add the middleware to the application
 app.add_middleware(SlowAPIMiddleware)
 
-app.add_exception_handler(HTTPException, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+# set up the concurrency bulkheads separating heavy from light endpoints
+bulkheads = Bulkheads(BULKHEAD_LIMITS)
+
+# per-worker memory budget for upload parsing
+upload_budget = UploadMemoryBudget(
+    budget=UPLOAD_MEMORY_BUDGET_MB * 1024 * 1024,
+    expansion_factor=UPLOAD_EXPANSION_FACTOR,
+    max_queue=UPLOAD_QUEUE_SIZE,
+    queue_timeout=UPLOAD_QUEUE_TIMEOUT,
+    retry_after=UPLOAD_RETRY_AFTER,
+)
 
 
 
@@ -65,6 +166,30 @@ app.add_exception_handler(HTTPException, _rate_limit_exceeded_handler)
 Authentication
 """
 
+@app.on_event("startup")
+async def start_logging():
+    """
+    Event handler that is invoked when the server is starting up.
+    This function starts the background log writer of this worker.
+    """
+    setup_logging(
+        log_file=LOG_FILE,
+        level=LOG_LEVEL,
+        module_levels=LOG_MODULE_LEVELS,
+        json_lines=LOG_JSON,
+        sampling=LOG_SAMPLING,
+    )
+
+
+@app.on_event("shutdown")
+async def stop_logging():
+    """
+    Event handler that is invoked when the server is shutting down.
+    This function flushes pending log records and stops the log writer.
+    """
+    shutdown_logging()
+
+
 @app.on_event("startup")
 async def start_db():
     """
@@ -158,6 +283,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """
+    Create a JWT refresh token.
+    The token carries a unique ID so it can be revoked.
+
+    Args:
+        data: The data to include in the token.
+        expires_delta: The duration that the token will be valid for. Defaults to REFRESH_TOKEN_EXPIRE_DAYS.
+
+    Returns:
+        str: The encoded JWT token.
+    """
+    if expires_delta is None:
+        expires_delta = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode = data.copy()
+    to_encode.update({"type": "refresh", "jti": uuid.uuid4().hex})
+    return create_access_token(to_encode, expires_delta=expires_delta)
+
+
+def decode_refresh_token(token: str) -> dict:
+    """
+    Decode a refresh token and check its signature, expiry and type.
+
+    Args:
+        token: The encoded refresh token.
+
+    Returns:
+        dict: The token payload.
+
+    Raises:
+        HTTPException: If the token is invalid or not a refresh token.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("type") != "refresh" or payload.get("sub") is None or payload.get("jti") is None:
+        raise credentials_exception
+    return payload
+
+
 async def get_current_user(db: AsyncSession = Depends(database.get_db),
                            token: str = Depends(oauth2_scheme)) -> database.User:
     """
@@ -182,7 +353,7 @@ async def get_current_user(db: AsyncSession = Depends(database.get_db),
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("type") == "refresh":
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
@@ -212,6 +383,58 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     return current_user
 
 
+def is_admin_user(user: database.User) -> bool:
+    """
+    Check whether a user is listed in ADMIN_USERS.
+
+    Args:
+        user: The User object.
+
+    Returns:
+        bool: True if the user is an admin.
+    """
+    return user.username in ADMIN_USERS
+
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> database.User:
+    """
+    Function to get the current admin user.
+    This function checks if the authenticated user is listed in ADMIN_USERS.
+
+    Args:
+        current_user: The authenticated User object.
+
+    Returns:
+        User: The authenticated User object.
+
+    Raises:
+        HTTPException: If the user is not an admin.
+    """
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+
+def is_admin_token(authorization: Optional[str]) -> bool:
+    """
+    Check whether an Authorization header carries a valid access token of an admin.
+    Only the token signature is checked, so this needs no database access.
+
+    Args:
+        authorization: The value of the Authorization header.
+
+    Returns:
+        bool: True if the token is valid and belongs to a user in ADMIN_USERS.
+    """
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    return payload.get("type") != "refresh" and payload.get("sub") in ADMIN_USERS
+
+
 # apply the limiter to relevant endpoints
 @app.post("/token", response_model=Token)
 @limiter.limit("10/minute")
@@ -220,7 +443,7 @@ async def login_for_access_token(
         db: AsyncSession = Depends(database.get_db),
         form_data: OAuth2PasswordRequestForm = Depends()):
     """
-    Endpoint to authenticate a user and provide an access token.
+    Endpoint to authenticate a user and provide an access token and a refresh token.
     The user needs to provide their username and password for authentication.
 
     Args:
@@ -228,7 +451,7 @@ async def login_for_access_token(
         form_data: Form data with username and password.
 
     Returns:
-        Token: The access token for the authenticated user.
+        Token: The access and refresh tokens for the authenticated user.
 
     Raises:
         HTTPException: If the authentication fails.
@@ -244,7 +467,63 @@ async def login_for_access_token(
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = create_refresh_token(data={"sub": user.username})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@app.post("/token/refresh", response_model=Token)
+@limiter.limit("60/minute")
+async def refresh_access_token(
+        request: Request,
+        body: RefreshRequest,
+        db: AsyncSession = Depends(database.get_db)):
+    """
+    Endpoint to exchange a refresh token for a new access token.
+    Only the token signature, its revocation state and the user are checked, no password is hashed.
+
+    Args:
+        body: The refresh token.
+        db: Database session.
+
+    Returns:
+        Token: The new access token and the unchanged refresh token.
+
+    Raises:
+        HTTPException: If the refresh token is invalid or revoked, or the user is unknown or inactive.
+    """
+    payload = decode_refresh_token(body.refresh_token)
+    user = None
+    if not await is_token_revoked(db, payload["jti"]):
+        user = await get_user(db, payload["sub"])
+    if user is None or user.disabled:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": body.refresh_token}
+
+
+@app.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_refresh_token(
+        body: RefreshRequest,
+        db: AsyncSession = Depends(database.get_db)):
+    """
+    Endpoint to revoke a refresh token, e.g. on logout.
+
+    Args:
+        body: The refresh token.
+        db: Database session.
+
+    Raises:
+        HTTPException: If the refresh token is invalid.
+    """
+    payload = decode_refresh_token(body.refresh_token)
+    await revoke_token(db, payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
 
 
 
@@ -287,30 +566,223 @@ async def StartPage():
 Reading and loading in JSON files.
 """
 
-@app.post("/uploadfiles/", dependencies=[Depends(oauth2_scheme)])
+# The multipart body is read inside the bulkhead, so it is declared here for the API docs.
+UPLOAD_FILES_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {
+                "type": "array",
+                "items": {"type": "string", "format": "binary"},
+                "description": "Multiple files as UploadFile",
+            }},
+            "required": ["files"],
+        }}},
+    }
+}
+
+
+@app.post("/uploadfiles/", openapi_extra=UPLOAD_FILES_BODY)
 @limiter.limit("10/minute")  # adjust the rate limit as needed
+@bulkheads.limit("bulk")
 async def create_upload_files(
         request: Request,
-        files: Annotated[
-            List[UploadFile], File(description="Multiple files as UploadFile")
-        ],
+        db: AsyncSession = Depends(database.get_db),
+        current_user: User = Depends(get_current_active_user),
 ):
     """
     Endpoint to upload multiple files.
-    The first file in the list is parsed as a JSON file.
+    The first file in the list is parsed as a JSON file and stored as the session with its SessionID,
+    owned by the current user. An earlier upload of that session is replaced, if it belongs to the
+    same user (or the user is an admin).
+    The multipart body is read inside the bulkhead. Parsing is admitted against the worker's upload
+    memory budget and runs in the thread pool.
+
+    Args:
+        request: The incoming request, with the files in the multipart field "files".
+        db: Database session.
+        current_user: The authenticated User object.
+
+    Returns:
+        Response: The parsed JSON data.
+
+    Raises:
+        HTTPException: 413 if the upload exceeds the memory budget,
+            503 with Retry-After if the budget is exhausted,
+            403 if the session belongs to another user.
+    """
+    async with request.form() as form:
+        files = [upload for upload in form.getlist("files") if not isinstance(upload, str)]
+        if not files:
+            raise RequestValidationError([ErrorWrapper(MissingError(), loc=("body", "files"))])
+        json_file = files[0].file
+        upload_size = json_file.seek(0, os.SEEK_END)
+        json_file.seek(0)
+        # The response is serialized while the reservation is held, as that is the largest peak.
+        async with upload_budget.reserve(upload_size) as reservation:
+            Parsed_input, content, columns = await run_in_threadpool(load_upload, json_file, reservation)
+            await store_session(db, Parsed_input, content, columns, current_user.username, is_admin_user(current_user))
+            del Parsed_input
+    return Response(content=content, media_type="application/json")
+
+
+def load_upload(json_file, reservation):
+    """
+    Load, parse and serialize an uploaded JSON file, sampling memory use after each stage.
+    The timestamped streams are also converted to Arrow columns for the binary export.
 
     Args:
-        files: List of uploaded files.
+        json_file: The uploaded file object.
+        reservation: The upload memory reservation to report to.
 
     Returns:
-        dict: The parsed JSON data.
+        tuple: The parsed JSON data, its serialized JSON and its serialized Arrow columns.
     """
-    json_file = files[0].file
-    json_file.seek(0)
     json_data = json.load(json_file)
+    reservation.sample()
     Parsed_input = parse_Json(json_data)
-    return Parsed_input
+    reservation.sample()
+    content = Parsed_input.json()
+    reservation.sample()
+    columns = session_export.table_to_bytes(session_export.session_table(Parsed_input.Data))
+    reservation.sample()
+    return Parsed_input, content, columns
+
+
+# The delta is validated inside the bulkhead, so its schema is declared here for the API docs.
+SESSION_DELTA_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/SessionDelta"}}},
+    }
+}
+_default_openapi = app.openapi
+
+
+def session_openapi():
+    """
+    Generate the OpenAPI schema with the SessionDelta models added to its components,
+    as no route declares them as a body parameter.
+
+    Returns:
+        dict: The OpenAPI schema.
+    """
+    if app.openapi_schema is None:
+        openapi_schema = _default_openapi()
+        schemas = openapi_schema.setdefault("components", {}).setdefault("schemas", {})
+        delta_schema = SessionDelta.schema(ref_template="#/components/schemas/{model}")
+        for name, definition in delta_schema.pop("definitions").items():
+            schemas.setdefault(name, definition)
+        schemas["SessionDelta"] = delta_schema
+    return app.openapi_schema
+
+
+app.openapi = session_openapi
+
+
+def load_delta(body: bytes):
+    """
+    Validate an appended delta and serialize it for storage.
+
+    Args:
+        body: The raw JSON body of the request.
+
+    Returns:
+        tuple: The parsed SessionDelta, its serialized JSON and its serialized Arrow columns.
+    """
+    delta = SessionDelta.parse_raw(body)
+    columns = session_export.table_to_bytes(session_export.session_table(delta))
+    return delta, delta.json(), columns
+
+
+@app.post("/sessions/{session_id}/append", openapi_extra=SESSION_DELTA_BODY)
+@limiter.limit("60/minute")
+@bulkheads.limit("sync")
+async def append_session(
+        request: Request,
+        session_id: int,
+        db: AsyncSession = Depends(database.get_db),
+        current_user: User = Depends(get_current_active_user),
+):
+    """
+    Endpoint to append the data recorded since the last sync to a stored session.
+    The JSON body is a SessionDelta with only the new TrackingRaw/Kinematics samples, ObjectEvents
+    and CommonEvents entries; they must continue each stream in timestamp order.
+    The body is read inside the bulkhead, and validated and serialized for storage in the thread pool.
+
+    Args:
+        request: The incoming request, with the SessionDelta as JSON body.
+        session_id: The SessionID of the session.
+        db: Database session.
+        current_user: The authenticated User object.
+
+    Returns:
+        dict: The SessionID and the number of chunks appended so far.
+    """
+    body = await request.body()
+    try:
+        delta, data, columns = await run_in_threadpool(load_delta, body)
+    except ValidationError as exc:
+        raise RequestValidationError([ErrorWrapper(exc, loc=("body",))], body=body)
+    chunks = await append_to_session(
+        db, session_id, delta, data, columns, current_user.username, is_admin_user(current_user)
+    )
+    return {"SessionID": session_id, "chunks": chunks}
+
+
+@app.get("/sessions/{session_id}")
+@bulkheads.limit("bulk")
+async def read_session(
+        session_id: int,
+        db: AsyncSession = Depends(database.get_db),
+        current_user: User = Depends(get_current_active_user),
+):
+    """
+    Endpoint to get a stored session of the current user with all appended data merged in.
+
+    Args:
+        session_id: The SessionID of the session.
+        db: Database session.
+        current_user: The authenticated User object.
+
+    Returns:
+        Response: The merged session data as JSON, serialized in the thread pool.
+    """
+    await check_session_access(db, session_id, current_user.username, is_admin_user(current_user))
+    session = await load_session(db, session_id)
+    content = await run_in_threadpool(json.dumps, session)
+    return Response(content=content, media_type="application/json")
+
+
+@app.get("/sessions/{session_id}/export")
+@bulkheads.limit("bulk")
+async def export_session(
+        session_id: int,
+        db: AsyncSession = Depends(database.get_db),
+        current_user: User = Depends(get_current_active_user),
+):
+    """
+    Endpoint to download the TrackingRaw, Kinematics and ObjectEvents data of a stored session
+    of the current user as typed columns in an Arrow IPC file, which can be memory-mapped.
+    The columns are built when the session is uploaded or appended to, so no JSON is parsed here.
 
+    Args:
+        session_id: The SessionID of the session.
+        db: Database session.
+        current_user: The authenticated User object.
+
+    Returns:
+        Response: The Arrow IPC file.
+    """
+    await check_session_access(db, session_id, current_user.username, is_admin_user(current_user))
+    stored = await load_session_columns(db, session_id)
+    content = await run_in_threadpool(session_export.export_arrow, stored)
+    return Response(
+        content=content,
+        media_type=session_export.MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="session_{session_id}.arrow"'},
+    )
 
 
 @app.get("/read_json/", dependencies=[Depends(oauth2_scheme)])
@@ -332,6 +804,41 @@ async def read_json():
     return HTMLResponse(content=content)
 
 
+@app.get("/admin/profiles")
+async def read_profiles(current_user: User = Depends(get_current_admin_user)):
+    """
+    Endpoint to list the saved request profiles.
+
+    Args:
+        current_user: The authenticated admin user.
+
+    Returns:
+        list: The name, size and modification time of each profile, newest first.
+    """
+    return await run_in_threadpool(request_profiler.list_profiles, PROFILE_DIR)
+
+
+@app.get("/admin/profiles/{name}")
+async def download_profile(name: str, current_user: User = Depends(get_current_admin_user)):
+    """
+    Endpoint to download a saved request profile as collapsed stacks.
+
+    Args:
+        name: The file name of the profile.
+        current_user: The authenticated admin user.
+
+    Returns:
+        FileResponse: The profile.
+
+    Raises:
+        HTTPException: If the profile does not exist.
+    """
+    path = os.path.join(PROFILE_DIR, os.path.basename(name))
+    if not name.endswith(".collapsed") or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown profile")
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(name))
+
+
 @app.get("/download_json/")
 async def main():
     """
@@ -343,14 +850,16 @@ async def main():
     return FileResponse("example.json", media_type="json", filename="Api.json")
 
 @app.post("/sum/")
+@bulkheads.limit("bulk")
 async def sum(a: int, b: int):
     """
     Sum two numbers
+    The C application runs in the thread pool so it does not block the event loop.
 
     Returns: sum
 
     """
-    return sum_of_numbers(a, b)
+    return await run_in_threadpool(sum_of_numbers, a, b)
 
 """
 Extra tutorial steps that might become useful
@@ -397,7 +906,7 @@ async def update_item(item_id: int, item: Item, user: User):
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     """
-    Middleware to add a process time header to each response.
+    Middleware to add a process time header to each response and write the access log record.
 
     Args:
         request: The incoming request.
@@ -410,6 +919,44 @@ async def add_process_time_header(request: Request, call_next):
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    log_access(request.method, request.url.path, response.status_code, process_time)
+    return response
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Middleware to profile requests flagged by an admin.
+    A request is profiled if it carries an admin access token and the X-Profile header
+    or profile query parameter. The sampling rate (samples per second) is taken from the
+    X-Profile-Rate header or profile_rate query parameter.
+
+    Args:
+        request: The incoming request.
+        call_next: The next middleware or route in the stack.
+
+    Returns:
+        Response: The outgoing response, with the saved profile name in X-Profile-File.
+    """
+    flag = request.headers.get("X-Profile") or request.query_params.get("profile")
+    if not flag or flag.lower() in ("0", "false") or not is_admin_token(request.headers.get("Authorization")):
+        return await call_next(request)
+    rate = request_profiler.sampling_rate(
+        request.headers.get("X-Profile-Rate") or request.query_params.get("profile_rate"),
+        PROFILE_DEFAULT_RATE, PROFILE_MAX_RATE,
+    )
+    profiler = request_profiler.try_start(rate)
+    if profiler is None:
+        response = await call_next(request)
+        response.headers["X-Profile-File"] = "busy"
+        return response
+    try:
+        response = await call_next(request)
+    finally:
+        name = await run_in_threadpool(
+            request_profiler.finish, profiler, PROFILE_DIR, request.method, request.url.path
+        )
+    response.headers["X-Profile-File"] = name
     return response
 
 
@@ -0,0 +1,109 @@
+"""
+API
+Script: Bounded FIFO admission queue shared by the upload memory budget and the bulkheads.
+
+A request is admitted at once if its cost fits the free capacity and no other
+request is waiting. Otherwise it waits in a bounded FIFO queue and is rejected
+with 503 + Retry-After when the queue is full or the wait times out.
+"""
+import asyncio
+from collections import deque
+
+from fastapi import HTTPException, status
+
+
+class AdmissionQueue:
+    """
+    Capacity shared by concurrent requests, with a bounded FIFO wait queue.
+
+    Attributes:
+        capacity: Total cost that admitted requests may hold.
+        max_queue: Maximum number of requests waiting for capacity.
+        queue_timeout: Seconds a request may wait before rejection.
+        retry_after: Seconds suggested to rejected clients via Retry-After.
+        detail: Detail of the 503 response of rejected requests.
+        in_use: Cost currently held by admitted requests.
+    """
+
+    def __init__(self, capacity: int, max_queue: int, queue_timeout: float, retry_after: int, detail: str):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.detail = detail
+        self.in_use = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        """
+        Number of requests in the wait queue, including abandoned ones not yet dropped.
+        """
+        return len(self._waiters)
+
+    async def acquire(self, cost: int):
+        """
+        Wait until the cost fits the free capacity and take it.
+
+        Args:
+            cost: The cost of the request.
+
+        Raises:
+            HTTPException: 503 if the wait queue is full or the wait timed out.
+        """
+        if not self._waiters and self.in_use + cost <= self.capacity:
+            self.in_use += cost
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self.overloaded()
+        waiter = (cost, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], self.queue_timeout)
+        except BaseException as exc:
+            if waiter[1].done() and not waiter[1].cancelled():
+                # The capacity was granted just as the wait was abandoned.
+                self.release(cost)
+            else:
+                # Another waiter's _wake() may already have dropped this abandoned entry.
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self.overloaded()
+            raise
+
+    def release(self, cost: int):
+        """
+        Return capacity and admit the waiting requests that now fit.
+
+        Args:
+            cost: The cost to return.
+        """
+        self.in_use -= cost
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            cost, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + cost > self.capacity:
+                break
+            self._waiters.popleft()
+            self.in_use += cost
+            future.set_result(None)
+
+    def overloaded(self) -> HTTPException:
+        """
+        Build the rejection of a request that could not be admitted.
+
+        Returns:
+            HTTPException: 503 with Retry-After.
+        """
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=self.detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
@@ -0,0 +1,83 @@
+"""
+API
+Script: Per-route concurrency bulkheads.
+
+A bulkhead bounds how many requests of a group of routes run at once in a
+worker. Further requests wait in a bounded queue for a limited time and are
+rejected with 503 + Retry-After otherwise, so saturated heavy routes cannot
+take the event loop and thread pool away from cheap ones.
+"""
+import functools
+
+from admission_queue import AdmissionQueue
+
+
+class Bulkhead:
+    """
+    Concurrency limit with a bounded wait queue.
+
+    Attributes:
+        name: The name of the bulkhead.
+        max_concurrent: Maximum number of requests running at once.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int = 0,
+                 queue_timeout: float = 1.0, retry_after: int = 1):
+        """
+        Args:
+            name: The name of the bulkhead.
+            max_concurrent: Maximum number of requests running at once.
+            max_queue: Maximum number of requests waiting for a slot.
+            queue_timeout: Seconds a request may wait for a slot.
+            retry_after: Seconds suggested to rejected clients via Retry-After.
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._queue = AdmissionQueue(max_concurrent, max_queue, queue_timeout, retry_after,
+                                     detail=f"Too many concurrent requests ({name}), try again later")
+
+    async def __aenter__(self):
+        await self._queue.acquire(1)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._queue.release(1)
+
+
+class Bulkheads:
+    """
+    Named bulkheads, applied to endpoints with the `limit` decorator.
+    """
+
+    def __init__(self, limits: dict[str, dict]):
+        """
+        Args:
+            limits: Mapping of bulkhead name to the keyword arguments of its Bulkhead.
+        """
+        self._bulkheads = {name: Bulkhead(name, **options) for name, options in limits.items()}
+
+    def limit(self, name: str):
+        """
+        Decorator running an async endpoint inside the named bulkhead.
+        Endpoints decorated with the same name share its slots and queue.
+
+        FastAPI validates declared body parameters before, and serializes the
+        return value after, the wrapped function. Heavy endpoints should read
+        their body from the Request and return a pre-serialized Response so
+        that work is held by the bulkhead too.
+
+        Args:
+            name: The name of the bulkhead.
+
+        Returns:
+            Callable: The decorator.
+        """
+        bulkhead = self._bulkheads[name]
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                async with bulkhead:
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
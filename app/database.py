@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Integer, LargeBinary, String, Text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import declarative_base
@@ -48,3 +48,59 @@ class User(Base):
     full_name = Column(String, index=True)
     disabled = Column(Boolean, default=False)
     hashed_password = Column(String)
+
+
+class RevokedToken(Base):
+    """
+    A revoked refresh token.
+
+    Attributes:
+        jti: The unique ID of the refresh token. This field is the primary key.
+        expires_at: When the token would have expired; the row can be removed afterwards.
+    """
+    __tablename__ = 'revoked_tokens'
+
+    jti = Column(String, primary_key=True, index=True)
+    expires_at = Column(DateTime)
+
+
+class LogSession(Base):
+    """
+    A stored session log, keyed by its SessionInfo.SessionID.
+
+    Attributes:
+        session_id: The SessionID of the session. This field is the primary key.
+        patient_id: The PatientID of the session.
+        owner: The username of the user who uploaded the session.
+        data: The uploaded RawLogFile as JSON.
+        columns: The timestamped streams of the upload as an Arrow IPC stream.
+        last_timestamps: JSON mapping of each timestamped stream to its last timestamp.
+        chunk_count: The number of appended chunks.
+    """
+    __tablename__ = 'sessions'
+
+    session_id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, index=True)
+    owner = Column(String, index=True)
+    data = Column(Text)
+    columns = Column(LargeBinary)
+    last_timestamps = Column(Text)
+    chunk_count = Column(Integer, default=0)
+
+
+class SessionChunk(Base):
+    """
+    Data appended to a stored session.
+
+    Attributes:
+        session_id: The SessionID of the session.
+        seq: The position of the chunk in the session, starting at 0.
+        data: The appended SessionDelta as JSON.
+        columns: The timestamped streams of the delta as an Arrow IPC stream.
+    """
+    __tablename__ = 'session_chunks'
+
+    session_id = Column(Integer, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(Text)
+    columns = Column(LargeBinary)
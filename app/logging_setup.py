@@ -0,0 +1,320 @@
+"""
+API
+Script: Buffered, asynchronous logging for the API workers.
+
+Log calls only build a LogRecord and put it on an in-process queue. A background
+thread formats the records and writes them in batches with one flush per batch,
+so formatting and file I/O stay off the request path.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Logger used for the per-request access records emitted by the application.
+access_logger = logging.getLogger("api.access")
+
+# Server error loggers that do not propagate to the root logger. Gunicorn's UvicornWorker
+# and the uvicorn CLI give them their own synchronous stream or file handlers.
+SERVER_LOGGERS = ("uvicorn.error", "gunicorn.error")
+
+_STOP = object()
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+
+    Structured fields passed with `extra={"fields": {...}}` are merged into the object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RouteSampler:
+    """
+    Keep only a fraction of the access records of high-volume routes.
+
+    Responses with a 5xx status are always kept.
+
+    Attributes:
+        rates: Mapping of route path prefix to the fraction of records to keep.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        # Longest prefix first so the most specific route wins.
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def keep(self, path: str, status: int) -> bool:
+        """
+        Decide whether the access record of a response is written.
+
+        Args:
+            path: The URL path of the request.
+            status: The status code of the response.
+
+        Returns:
+            bool: True if the record should be logged.
+        """
+        if status >= 500:
+            return True
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+
+_sampler = RouteSampler({})
+_writer = None
+_queue_handler = None
+
+
+def log_access(method: str, path: str, status: int, duration: float):
+    """
+    Write the access record of a request, unless it is sampled out.
+
+    Sampling happens before anything is built, so a dropped record costs one
+    prefix lookup. Once the writer runs, a kept record is queued as a plain
+    tuple and only turned into a LogRecord on the writer thread.
+
+    Args:
+        method: The HTTP method of the request.
+        path: The URL path of the request.
+        status: The status code of the response.
+        duration: Seconds spent processing the request.
+    """
+    if not access_logger.isEnabledFor(logging.INFO) or not _sampler.keep(path, status):
+        return
+    if _queue_handler is not None:
+        _queue_handler.enqueue((time.time_ns(), method, path, status, duration))
+    else:
+        access_logger.info(
+            "%s %s %s", method, path, status,
+            extra={"fields": {"method": method, "path": path, "status": status, "duration": duration}},
+        )
+
+
+def _access_record(entry: tuple) -> logging.LogRecord:
+    created_ns, method, path, status, duration = entry
+    # All time fields come from the request's timestamp, not from when the writer built the record.
+    created = created_ns / 1e9
+    return logging.makeLogRecord({
+        "name": access_logger.name, "levelno": logging.INFO, "levelname": "INFO",
+        "msg": "%s %s %s", "args": (method, path, status),
+        "created": created,
+        "msecs": (created_ns % 1_000_000_000) // 1_000_000 + 0.0,
+        "relativeCreated": (created - logging._startTime) * 1000,
+        "fields": {"method": method, "path": path, "status": status, "duration": duration},
+    })
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that enqueues records without formatting them.
+
+    The queue is in-process, so the record can be handed over as is and the
+    message is only rendered on the writer thread. When the queue holds
+    `maxsize` records, further records are dropped and counted instead of
+    blocking the caller.
+
+    Attributes:
+        maxsize: Maximum number of queued records.
+        dropped: Number of records dropped because the queue was full.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, maxsize: int):
+        super().__init__(log_queue)
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record):
+        # SimpleQueue has no locking overhead; the size check may overshoot by a few records.
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+
+class BatchWriter:
+    """
+    Background thread that drains the log queue and writes records in batches.
+
+    Write errors (e.g. a full disk or a closed file) are reported and the
+    writer keeps running; a file is reopened before the next batch.
+
+    Attributes:
+        queue_handler: The DeferredQueueHandler filling the queue.
+        handler: The stream handler used to format and write the records.
+        batch_size: Maximum number of records written per flush.
+    """
+
+    def __init__(self, queue_handler: DeferredQueueHandler, handler: logging.StreamHandler, batch_size: int = 256):
+        self.queue_handler = queue_handler
+        self.queue = queue_handler.queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self._reported_dropped = 0
+        self._thread = None
+
+    def start(self):
+        """
+        Start the writer thread.
+        """
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Write all pending records and stop the writer thread.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        self.handler.close()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: list) -> bool:
+        stopping = False
+        records = []
+        for item in batch:
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, tuple):
+                records.append(_access_record(item))
+            else:
+                records.append(item)
+        dropped = self.queue_handler.dropped
+        if dropped != self._reported_dropped:
+            records.append(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "%d log records dropped because the log queue was full",
+                "args": (dropped - self._reported_dropped,),
+            }))
+            self._reported_dropped = dropped
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.handler.format(record) + self.handler.terminator)
+            except Exception:
+                self.handler.handleError(record)
+        if lines:
+            try:
+                if self.handler.stream is None:
+                    self.handler.stream = self.handler._open()
+                self.handler.stream.write("".join(lines))
+                self.handler.stream.flush()
+            except Exception:
+                self.handler.handleError(records[0])
+                if isinstance(self.handler, logging.FileHandler):
+                    # Reopen the file before the next batch, e.g. after it was rotated away.
+                    stream, self.handler.stream = self.handler.stream, None
+                    try:
+                        stream.close()
+                    except Exception:
+                        pass
+        return stopping
+
+
+def setup_logging(log_file: str = None, level: str = "INFO", module_levels: dict[str, str] = None,
+                  json_lines: bool = True, sampling: dict[str, float] = None,
+                  batch_size: int = 256, queue_size: int = 10000) -> BatchWriter:
+    """
+    Route all logging, including the server error loggers, through a background queue writer.
+
+    Must be called once per worker process, after the fork.
+
+    Args:
+        log_file: File to append the log to. Defaults to stderr.
+        level: Level of the root logger.
+        module_levels: Mapping of logger name to level, e.g. {"sqlalchemy.engine": "WARNING"}.
+        json_lines: Write JSON lines instead of plain text records.
+        sampling: Mapping of route path prefix to the fraction of access records to keep.
+        batch_size: Maximum number of records written per flush.
+        queue_size: Maximum number of queued records; further records are dropped and counted.
+
+    Returns:
+        BatchWriter: The started writer.
+    """
+    global _writer, _queue_handler, _sampler
+    if _writer is not None:
+        return _writer
+
+    # Skip the caller, thread and process lookups done for every LogRecord; the formats do not use them.
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    if log_file:
+        handler = logging.FileHandler(log_file, encoding="utf-8")
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    if json_lines:
+        handler.setFormatter(JsonLineFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    _queue_handler = DeferredQueueHandler(queue.SimpleQueue(), queue_size)
+    _sampler = RouteSampler(sampling or {})
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(level)
+    # Server errors, including unhandled exceptions of the application, go through the queue as well.
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        server_logger.handlers = [_queue_handler]
+        server_logger.propagate = False
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _writer = BatchWriter(_queue_handler, handler, batch_size=batch_size)
+    _writer.start()
+    return _writer
+
+
+def shutdown_logging():
+    """
+    Flush pending records and stop the background writer.
+    """
+    global _writer, _queue_handler
+    if _writer is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        for name in SERVER_LOGGERS:
+            logging.getLogger(name).removeHandler(_queue_handler)
+        _writer.stop()
+        _writer = None
+        _queue_handler = None
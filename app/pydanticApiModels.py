@@ -10,9 +10,21 @@ class Token(BaseModel):
     Attributes:
         access_token: The access token string.
         token_type: The type of the token.
+        refresh_token: The refresh token string, defaults to None.
     """
     access_token: str
     token_type: str
+    refresh_token: Union[str, None] = None
+
+
+class RefreshRequest(BaseModel):
+    """
+    Schema for exchanging or revoking a refresh token.
+
+    Attributes:
+        refresh_token: The refresh token string.
+    """
+    refresh_token: str
 
 
 class TokenData(BaseModel):
@@ -0,0 +1,159 @@
+"""
+API
+Script: On-demand sampling profiler for single requests.
+
+While a profiled request is in flight, a background thread samples the stacks of
+all other threads of the worker (the event loop and the thread pool) at a fixed
+rate. The samples are saved as collapsed stacks, one "frame;frame;frame count"
+line per distinct stack, which flamegraph tools read directly.
+"""
+import math
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# Only one request per worker is profiled at a time, as samples cover every thread.
+_profiling = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all threads of the process at a fixed rate.
+
+    Attributes:
+        interval: Seconds between samples.
+        counts: Number of samples per collapsed stack.
+    """
+
+    def __init__(self, rate: float = 200.0):
+        self.interval = 1.0 / rate
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+        """
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and wait for the sampler thread.
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """
+        Return the samples as collapsed stacks.
+
+        Returns:
+            str: One "frame;frame;frame count" line per distinct stack.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def sampling_rate(value: str, default: float, maximum: float) -> float:
+    """
+    Parse a requested sampling rate and clamp it to 1..maximum samples per second.
+
+    Args:
+        value: The requested rate, or None.
+        default: Rate used if none, an unparsable or a non-finite rate was requested.
+        maximum: Highest allowed rate.
+
+    Returns:
+        float: The sampling rate.
+    """
+    try:
+        rate = float(value or default)
+    except ValueError:
+        rate = default
+    # NaN passes through min/max and would make the sampler spin without waiting.
+    if not math.isfinite(rate):
+        rate = default
+    return min(max(rate, 1.0), maximum)
+
+
+def try_start(rate: float):
+    """
+    Start profiling a request unless another request of this worker is being profiled.
+
+    Args:
+        rate: Samples per second.
+
+    Returns:
+        SamplingProfiler: The started profiler, or None if profiling is busy.
+    """
+    if not _profiling.acquire(blocking=False):
+        return None
+    profiler = SamplingProfiler(rate)
+    profiler.start()
+    return profiler
+
+
+def finish(profiler: SamplingProfiler, profile_dir: str, method: str, path: str) -> str:
+    """
+    Stop a profiler and save its samples.
+
+    Args:
+        profiler: The running profiler from try_start.
+        profile_dir: Directory to save the profile in.
+        method: The HTTP method of the profiled request.
+        path: The URL path of the profiled request.
+
+    Returns:
+        str: The file name of the saved profile.
+    """
+    try:
+        profiler.stop()
+    finally:
+        _profiling.release()
+    route = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    # The random suffix keeps profiles of the same route within one second apart.
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{method}_{route}_{uuid.uuid4().hex[:8]}.collapsed"
+    os.makedirs(profile_dir, exist_ok=True)
+    with open(os.path.join(profile_dir, name), "w", encoding="utf-8") as profile:
+        profile.write(profiler.collapsed())
+    return name
+
+
+def list_profiles(profile_dir: str) -> list[dict]:
+    """
+    List the saved profiles, newest first.
+
+    Args:
+        profile_dir: Directory the profiles are saved in.
+
+    Returns:
+        list: The name, size and modification time of each profile.
+    """
+    if not os.path.isdir(profile_dir):
+        return []
+    profiles = []
+    for entry in os.scandir(profile_dir):
+        if entry.is_file() and entry.name.endswith(".collapsed"):
+            stat = entry.stat()
+            profiles.append({"name": entry.name, "size": stat.st_size, "modified": stat.st_mtime})
+    return sorted(profiles, key=lambda profile: profile["modified"], reverse=True)
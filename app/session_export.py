@@ -0,0 +1,99 @@
+"""
+API
+Script: Binary columnar export of stored sessions.
+
+The TrackingRaw, Kinematics and ObjectEvents streams of a session are converted
+to an Arrow table once, when the session is uploaded or appended to, and stored
+next to its JSON. An export only stitches the stored record batches together
+into an Arrow IPC file, which clients can memory-map and read without decoding
+(e.g. `pyarrow.ipc.open_file(pyarrow.memory_map(path))`).
+
+Every row is one sample or event:
+    stream: "TrackingRaw", "Kinematics" or "ObjectEvents"
+    key: The tracked body part or object
+    t: The timestamp (int64)
+    X, Y, Z: The position (float64, null where the upload had NaN)
+    id, value: The object event ID and value (null for positions)
+Rows of a stream and key are in timestamp order.
+"""
+import pyarrow as pa
+
+SCHEMA = pa.schema([
+    ("stream", pa.dictionary(pa.int8(), pa.string())),
+    ("key", pa.dictionary(pa.int32(), pa.string())),
+    ("t", pa.int64()),
+    ("X", pa.float64()),
+    ("Y", pa.float64()),
+    ("Z", pa.float64()),
+    ("id", pa.int64()),
+    ("value", pa.string()),
+])
+
+MEDIA_TYPE = "application/vnd.apache.arrow.file"
+
+
+def session_table(data) -> pa.Table:
+    """
+    Convert the timestamped streams of a session to an Arrow table.
+
+    Args:
+        data: The Data of a RawLogFile or a SessionDelta.
+
+    Returns:
+        pa.Table: One row per sample or event, with the SCHEMA columns.
+    """
+    columns = {name: [] for name in SCHEMA.names}
+
+    def add(stream, key, entries, events=False):
+        columns["stream"].extend([stream] * len(entries))
+        columns["key"].extend([key] * len(entries))
+        columns["t"].extend(entry.t for entry in entries)
+        columns["X"].extend(entry.X for entry in entries)
+        columns["Y"].extend(entry.Y for entry in entries)
+        columns["Z"].extend(entry.Z for entry in entries)
+        columns["id"].extend(entry.id if events else None for entry in entries)
+        columns["value"].extend(entry.value if events else None for entry in entries)
+
+    for stream in ("TrackingRaw", "Kinematics"):
+        for key, positions in getattr(data, stream).items():
+            add(stream, key, positions.Position)
+    for key, events in data.ObjectEvents.items():
+        add("ObjectEvents", key, events, events=True)
+    return pa.table(columns, schema=SCHEMA)
+
+
+def table_to_bytes(table: pa.Table) -> bytes:
+    """
+    Serialize a table for storage in the Arrow IPC stream format.
+
+    Args:
+        table: The table to serialize.
+
+    Returns:
+        bytes: The serialized table.
+    """
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, SCHEMA) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def export_arrow(stored: list) -> bytes:
+    """
+    Combine the stored tables of a session into one Arrow IPC file.
+
+    The numeric columns are not converted; only the dictionaries of the
+    stream and key columns are unified across the stored tables.
+
+    Args:
+        stored: The serialized tables of the session base and its chunks, in order.
+
+    Returns:
+        bytes: The Arrow IPC file.
+    """
+    tables = [pa.ipc.open_stream(pa.py_buffer(blob)).read_all() for blob in stored]
+    table = pa.concat_tables(tables).unify_dictionaries()
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, SCHEMA) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
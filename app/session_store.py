@@ -0,0 +1,267 @@
+"""
+API
+Script: Storage of uploaded sessions and incremental appends.
+
+A full upload stores the session as its base. Later syncs append only the new
+data as a chunk, after checking that its timestamps continue the stored
+streams, so an append costs time proportional to the new data. The chunks are
+merged into the base when the session is read.
+
+A session can only be read, appended to or replaced by the user who uploaded
+it, or by an admin.
+"""
+import json
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+from InternalCode.json_parser import RawLogFile, SessionDelta
+
+
+def _timestamped_streams(data):
+    """
+    Iterate over the timestamped streams of a RawLogFile's Data or a SessionDelta.
+
+    Args:
+        data: The Data of a RawLogFile or a SessionDelta.
+
+    Yields:
+        tuple: The stream name and its list of timestamped entries.
+    """
+    yield "CommonEvents/RegisterScore", data.CommonEvents.RegisterScore
+    yield "CommonEvents/IrcComputeDifficulty", data.CommonEvents.IrcComputeDifficulty
+    for key, events in data.ObjectEvents.items():
+        yield f"ObjectEvents/{key}", events
+    for key, positions in data.TrackingRaw.items():
+        yield f"TrackingRaw/{key}", positions.Position
+    for key, positions in data.Kinematics.items():
+        yield f"Kinematics/{key}", positions.Position
+
+
+def last_timestamps(data) -> dict:
+    """
+    Get the last timestamp of every non-empty stream.
+
+    Args:
+        data: The Data of a RawLogFile or a SessionDelta.
+
+    Returns:
+        dict: Mapping of stream name to its last timestamp.
+    """
+    return {stream: entries[-1].t for stream, entries in _timestamped_streams(data) if entries}
+
+
+def check_delta_order(stored_last: dict, delta: SessionDelta) -> dict:
+    """
+    Check that every stream of a delta is in timestamp order and continues the stored stream.
+
+    Args:
+        stored_last: Mapping of stream name to the last stored timestamp.
+        delta: The data to append.
+
+    Returns:
+        dict: The last timestamps after appending the delta.
+
+    Raises:
+        HTTPException: If a timestamp is earlier than the one before it.
+    """
+    new_last = dict(stored_last)
+    for stream, entries in _timestamped_streams(delta):
+        previous = stored_last.get(stream)
+        for entry in entries:
+            if previous is not None and entry.t < previous:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"{stream}: timestamp {entry.t} is before {previous}",
+                )
+            previous = entry.t
+        if previous is not None:
+            new_last[stream] = previous
+    return new_last
+
+
+def apply_delta(data: dict, delta: dict):
+    """
+    Merge an appended delta into the Data of a session, in place.
+
+    Args:
+        data: The Data of the session as a dict.
+        delta: The appended SessionDelta as a dict.
+    """
+    common = data["CommonEvents"]
+    for name, value in delta["CommonEvents"].items():
+        if isinstance(value, list):
+            common.setdefault(name, []).extend(value)
+        elif value is not None:
+            common[name] = value
+    for key, events in delta["ObjectEvents"].items():
+        data["ObjectEvents"].setdefault(key, []).extend(events)
+    for name in ("TrackingRaw", "Kinematics"):
+        for key, positions in delta[name].items():
+            data[name].setdefault(key, {"Position": []})["Position"].extend(positions["Position"])
+
+
+def _authorize(owner: str, username: str, is_admin: bool):
+    # Sessions of other users are reported as unknown so their SessionIDs cannot be probed.
+    if owner is None or (owner != username and not is_admin):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown session")
+
+
+def _merge(base: str, chunks: list) -> dict:
+    session = json.loads(base)
+    for chunk in chunks:
+        apply_delta(session["Data"], json.loads(chunk))
+    return session
+
+
+async def store_session(db: AsyncSession, parsed: RawLogFile, data: str, columns: bytes,
+                        username: str, is_admin: bool = False):
+    """
+    Store a fully uploaded session, replacing any earlier upload and appends.
+
+    Args:
+        db: Database session.
+        parsed: The parsed upload.
+        data: The parsed upload serialized as JSON.
+        columns: The timestamped streams of the upload as an Arrow IPC stream.
+        username: The uploading user, who becomes the owner of a new session.
+        is_admin: Whether the user may replace sessions of other users.
+
+    Raises:
+        HTTPException: If the session exists and belongs to another user.
+    """
+    session_id = parsed.Header.SessionInfo.SessionID
+    result = await db.execute(select(database.LogSession.owner).filter_by(session_id=session_id))
+    owner = result.scalar()
+    if owner is not None and owner != username and not is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session belongs to another user")
+    await db.execute(delete(database.SessionChunk).where(database.SessionChunk.session_id == session_id))
+    await db.merge(database.LogSession(
+        session_id=session_id,
+        patient_id=parsed.Header.SessionInfo.PatientID,
+        owner=owner or username,
+        data=data,
+        columns=columns,
+        last_timestamps=json.dumps(last_timestamps(parsed.Data)),
+        chunk_count=0,
+    ))
+    await db.commit()
+
+
+async def append_to_session(db: AsyncSession, session_id: int, delta: SessionDelta, data: str,
+                            columns: bytes, username: str, is_admin: bool = False) -> int:
+    """
+    Append new data to a stored session.
+
+    Args:
+        db: Database session.
+        session_id: The SessionID of the session.
+        delta: The data received since the last sync.
+        data: The delta serialized as JSON.
+        columns: The timestamped streams of the delta as an Arrow IPC stream.
+        username: The user sending the data.
+        is_admin: Whether the user may append to sessions of other users.
+
+    Returns:
+        int: The number of chunks appended to the session so far.
+
+    Raises:
+        HTTPException: 404 if the session is unknown or not accessible, 422 if the delta is out of
+            timestamp order, 409 if the session was changed by a concurrent sync.
+    """
+    result = await db.execute(
+        select(database.LogSession.owner, database.LogSession.last_timestamps, database.LogSession.chunk_count)
+        .filter_by(session_id=session_id)
+    )
+    row = result.first()
+    _authorize(row.owner if row else None, username, is_admin)
+    new_last = check_delta_order(json.loads(row.last_timestamps), delta)
+    updated = await db.execute(
+        update(database.LogSession)
+        .where(database.LogSession.session_id == session_id,
+               database.LogSession.chunk_count == row.chunk_count)
+        .values(last_timestamps=json.dumps(new_last), chunk_count=row.chunk_count + 1)
+    )
+    if updated.rowcount != 1:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Session was changed by another sync, retry")
+    db.add(database.SessionChunk(
+        session_id=session_id,
+        seq=row.chunk_count,
+        data=data,
+        columns=columns,
+    ))
+    await db.commit()
+    return row.chunk_count + 1
+
+
+async def check_session_access(db: AsyncSession, session_id: int, username: str, is_admin: bool = False):
+    """
+    Check that a user may access a stored session.
+
+    Args:
+        db: Database session.
+        session_id: The SessionID of the session.
+        username: The requesting user.
+        is_admin: Whether the user may access sessions of other users.
+
+    Raises:
+        HTTPException: If the session is unknown or belongs to another user.
+    """
+    result = await db.execute(select(database.LogSession.owner).filter_by(session_id=session_id))
+    _authorize(result.scalar(), username, is_admin)
+
+
+async def load_session(db: AsyncSession, session_id: int) -> dict:
+    """
+    Load a stored session with all appended chunks merged in.
+
+    Args:
+        db: Database session.
+        session_id: The SessionID of the session.
+
+    Returns:
+        dict: The merged RawLogFile as a dict.
+
+    Raises:
+        HTTPException: If the session is unknown.
+    """
+    result = await db.execute(select(database.LogSession.data).filter_by(session_id=session_id))
+    base = result.scalar()
+    if base is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown session")
+    result = await db.execute(
+        select(database.SessionChunk.data)
+        .filter_by(session_id=session_id)
+        .order_by(database.SessionChunk.seq)
+    )
+    return await run_in_threadpool(_merge, base, result.scalars().all())
+
+
+async def load_session_columns(db: AsyncSession, session_id: int) -> list:
+    """
+    Load the stored Arrow tables of a session and its appended chunks.
+
+    Args:
+        db: Database session.
+        session_id: The SessionID of the session.
+
+    Returns:
+        list: The serialized tables, base first, then the chunks in order.
+
+    Raises:
+        HTTPException: If the session is unknown.
+    """
+    result = await db.execute(select(database.LogSession.columns).filter_by(session_id=session_id))
+    base = result.scalar()
+    if base is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown session")
+    result = await db.execute(
+        select(database.SessionChunk.columns)
+        .filter_by(session_id=session_id)
+        .order_by(database.SessionChunk.seq)
+    )
+    return [base] + list(result.scalars().all())
@@ -0,0 +1,104 @@
+"""
+API
+Script: Refresh token revocation with an in-memory lookup cache.
+
+Revoked refresh tokens are stored in the database so every worker sees them.
+Lookups are cached per worker for a short time, so refreshing an access token
+usually needs no database round trip for the revocation check.
+"""
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+
+
+class RevocationCache:
+    """
+    Time-limited cache of refresh token revocation states.
+
+    Attributes:
+        ttl: Seconds a cached state is trusted. Bounds how long another worker may
+            keep accepting a token after it was revoked.
+        max_entries: Maximum number of cached token IDs.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def get(self, jti: str) -> Optional[bool]:
+        """
+        Look up the cached revocation state of a token.
+
+        Args:
+            jti: The unique ID of the token.
+
+        Returns:
+            bool: True if revoked, False if not, or None if the state is unknown or stale.
+        """
+        entry = self._entries.get(jti)
+        if entry is None:
+            return None
+        revoked, stored_at = entry
+        if not revoked and time.monotonic() - stored_at > self.ttl:
+            del self._entries[jti]
+            return None
+        return revoked
+
+    def set(self, jti: str, revoked: bool):
+        """
+        Store the revocation state of a token.
+
+        Args:
+            jti: The unique ID of the token.
+            revoked: Whether the token is revoked.
+        """
+        if len(self._entries) >= self.max_entries and jti not in self._entries:
+            # Drop the oldest entry; dicts keep insertion order.
+            del self._entries[next(iter(self._entries))]
+        self._entries[jti] = (revoked, time.monotonic())
+
+
+revocation_cache = RevocationCache()
+
+
+async def is_token_revoked(db: AsyncSession, jti: str) -> bool:
+    """
+    Check whether a refresh token has been revoked, using the cache when possible.
+
+    Args:
+        db: Database session.
+        jti: The unique ID of the refresh token.
+
+    Returns:
+        bool: True if the token has been revoked.
+    """
+    revoked = revocation_cache.get(jti)
+    if revoked is None:
+        result = await db.execute(select(database.RevokedToken.jti).filter_by(jti=jti))
+        revoked = result.scalar() is not None
+        revocation_cache.set(jti, revoked)
+    return revoked
+
+
+async def revoke_token(db: AsyncSession, jti: str, expires_at: datetime):
+    """
+    Revoke a refresh token.
+
+    Expired revocations are purged in the same transaction.
+
+    Args:
+        db: Database session.
+        jti: The unique ID of the refresh token.
+        expires_at: The expiry time of the refresh token.
+    """
+    if not await is_token_revoked(db, jti):
+        await db.execute(delete(database.RevokedToken).where(database.RevokedToken.expires_at < datetime.utcnow()))
+        await db.merge(database.RevokedToken(jti=jti, expires_at=expires_at))
+        await db.commit()
+    revocation_cache.set(jti, True)
@@ -0,0 +1,182 @@
+"""
+API
+Script: Memory-budget admission control for JSON upload processing.
+
+Every gunicorn worker keeps a budget for the memory held by in-flight upload
+parses. An upload reserves an estimate (upload size times an expansion factor)
+before it is parsed; uploads that do not fit wait in a bounded FIFO queue and
+are rejected with 503 + Retry-After when the queue is full or the wait times out.
+While parses run, the worker RSS is sampled and the reserved total grows if the
+RSS growth since the first of them started exceeds the sum of their estimates.
+"""
+import asyncio
+import math
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+from admission_queue import AdmissionQueue
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss() -> int:
+    """
+    Return the resident set size of this process in bytes.
+
+    Returns:
+        int: The RSS in bytes, or 0 if it cannot be determined on this platform.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class Reservation:
+    """
+    Memory reserved for a single upload parse.
+
+    Attributes:
+        upload_size: The size of the uploaded file in bytes.
+        reserved: The estimated number of bytes reserved for this upload.
+        peak: The largest RSS growth observed while the parse was running.
+    """
+
+    def __init__(self, budget: "UploadMemoryBudget", upload_size: int, reserved: int):
+        self._budget = budget
+        self._loop = asyncio.get_running_loop()
+        self.upload_size = upload_size
+        self.reserved = reserved
+        self.peak = 0
+
+    def sample(self):
+        """
+        Record the current RSS growth of the worker.
+
+        Safe to call from the thread running the parse. The growth covers all
+        in-flight parses, so it is compared with the budget's total reservation
+        and, if larger, the total is raised to it on the event loop.
+        """
+        growth = self._budget._rss_growth()
+        if growth > self.peak:
+            self.peak = growth
+            if growth > self._budget.reserved:
+                self._loop.call_soon_threadsafe(self._budget._grow, growth)
+
+
+class UploadMemoryBudget:
+    """
+    Per-worker admission control for memory-heavy upload parses.
+
+    Attributes:
+        budget: Total bytes that in-flight parses may hold.
+        expansion_factor: Estimated parse memory per uploaded byte. Measured
+            ratios can raise, but never lower, the estimate below this value.
+    """
+
+    def __init__(self, budget: int, expansion_factor: float = 6.0, max_queue: int = 8,
+                 queue_timeout: float = 10.0, retry_after: int = 5):
+        """
+        Args:
+            budget: Total bytes that in-flight parses may hold.
+            expansion_factor: Estimated parse memory per uploaded byte.
+            max_queue: Maximum number of uploads waiting for budget.
+            queue_timeout: Seconds an upload may wait for budget before rejection.
+            retry_after: Seconds suggested to rejected clients via Retry-After.
+        """
+        self.budget = budget
+        self.expansion_factor = expansion_factor
+        self._queue = AdmissionQueue(budget, max_queue, queue_timeout, retry_after,
+                                     detail="Server is busy processing uploads, try again later")
+        self._measured_factor = expansion_factor
+        self._in_flight = 0
+        # RSS when the current run of in-flight parses started, and the measured
+        # growth beyond the sum of their estimates.
+        self._baseline = 0
+        self._overrun = 0
+
+    @property
+    def reserved(self) -> int:
+        """
+        Bytes currently reserved by in-flight parses.
+        """
+        return self._queue.in_use
+
+    def estimate(self, upload_size: int) -> int:
+        """
+        Estimate the memory a parse of the given upload will need.
+
+        Args:
+            upload_size: The size of the uploaded file in bytes.
+
+        Returns:
+            int: The estimated number of bytes.
+        """
+        factor = max(self.expansion_factor, self._measured_factor)
+        return int(math.ceil(upload_size * factor))
+
+    @asynccontextmanager
+    async def reserve(self, upload_size: int):
+        """
+        Reserve budget for parsing an upload for the duration of the context.
+
+        Args:
+            upload_size: The size of the uploaded file in bytes.
+
+        Yields:
+            Reservation: The reservation, whose `sample` method should be called during the parse.
+
+        Raises:
+            HTTPException: 413 if the upload can never fit the budget,
+                503 if the wait queue is full or the wait timed out.
+        """
+        needed = self.estimate(upload_size)
+        if needed > self.budget:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Upload is too large to be processed",
+            )
+        await self._queue.acquire(needed)
+        if not self._in_flight:
+            self._baseline = current_rss()
+        reservation = Reservation(self, upload_size, needed)
+        self._in_flight += 1
+        try:
+            yield reservation
+        finally:
+            self._in_flight -= 1
+            self._learn(reservation)
+            self._finish(reservation)
+
+    def _rss_growth(self) -> int:
+        if not self._baseline:
+            return 0
+        return current_rss() - self._baseline
+
+    def _grow(self, total: int):
+        if self._in_flight and total > self.reserved:
+            self._overrun += total - self.reserved
+            self._queue.in_use = total
+
+    def _finish(self, reservation: Reservation):
+        # The overrun cannot be attributed to one parse; release the share of the finished one.
+        estimates = self.reserved - self._overrun
+        if not self._in_flight or estimates <= 0:
+            share = self._overrun
+        else:
+            share = self._overrun * reservation.reserved // estimates
+        self._overrun -= share
+        self._queue.release(reservation.reserved + share)
+
+    def _learn(self, reservation: Reservation):
+        # RSS growth can only be attributed to a parse that ran alone.
+        if self._in_flight or not reservation.upload_size or not reservation.peak:
+            return
+        ratio = reservation.peak / reservation.upload_size
+        self._measured_factor = 0.8 * self._measured_factor + 0.2 * ratio
@@ -17,7 +17,7 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./sqlite3.db"
 # An engine that stores the connection to the database.
 # The engine is created by using the database URL and passing additional connection arguments.
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, echo=True
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, echo=False
 )
 
 # The base class for all models.
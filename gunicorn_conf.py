@@ -8,6 +8,9 @@ workers = cpu_count() + 1
 worker_class = 'uvicorn.workers.UvicornWorker'
 
 # Logging Options
-loglevel = 'debug'
-accesslog = '<path_to_log_dir>/access_log'
+# Once a worker has started, access records and server errors (uvicorn.error, gunicorn.error) are
+# written by the application through its background log writer (LOG_FILE in Tutorial.py).
+# errorlog only receives the messages of the gunicorn master and of worker startup.
+loglevel = 'warning'
+accesslog = None
 errorlog =  '<path_to_log_dir>/error_log'
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission_queue import AdmissionQueue
+
+
+def make_queue(**kwargs):
+    options = {"capacity": 100, "max_queue": 2, "queue_timeout": 0.05, "retry_after": 5, "detail": "busy"}
+    options.update(kwargs)
+    return AdmissionQueue(**options)
+
+
+async def hold(admission, cost, started, release):
+    await admission.acquire(cost)
+    started.set()
+    await release.wait()
+    admission.release(cost)
+
+
+def test_queued_request_is_admitted_on_release():
+    async def run():
+        admission = make_queue(queue_timeout=1.0)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(admission, 60, started, release))
+        await started.wait()
+        waiter = asyncio.create_task(admission.acquire(60))
+        await asyncio.sleep(0)
+        assert admission.waiting == 1
+        release.set()
+        await waiter
+        await holder
+        assert admission.in_use == 60
+        assert admission.waiting == 0
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_rejected_with_503():
+    async def run():
+        admission = make_queue(max_queue=0)
+        await admission.acquire(60)
+        with pytest.raises(HTTPException) as error:
+            await admission.acquire(60)
+        assert error.value.status_code == 503
+        assert error.value.detail == "busy"
+        assert error.value.headers["Retry-After"] == "5"
+        assert admission.in_use == 60
+
+    asyncio.run(run())
+
+
+def test_simultaneous_timeouts_are_rejected_with_503():
+    async def run():
+        admission = make_queue()
+        await admission.acquire(60)
+        results = await asyncio.gather(admission.acquire(60), admission.acquire(60), return_exceptions=True)
+        assert [result.status_code for result in results] == [503, 503]
+        assert admission.waiting == 0
+        admission.release(60)
+        assert admission.in_use == 0
+
+    asyncio.run(run())
+
+
+def test_simultaneous_cancellations_leave_capacity_consistent():
+    async def run():
+        admission = make_queue(queue_timeout=1.0)
+        await admission.acquire(60)
+        waiters = [asyncio.create_task(admission.acquire(60)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+        assert admission.waiting == 0
+        admission.release(60)
+        assert admission.in_use == 0
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+import asyncio
+import inspect
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
+
+from bulkhead import Bulkheads
+
+
+def test_named_bulkheads_are_separate():
+    async def run():
+        bulkheads = Bulkheads({
+            "bulk": {"max_concurrent": 1},
+            "sync": {"max_concurrent": 1},
+        })
+        started, release = asyncio.Event(), asyncio.Event()
+
+        @bulkheads.limit("bulk")
+        async def heavy():
+            started.set()
+            await release.wait()
+
+        @bulkheads.limit("bulk")
+        async def other_heavy():
+            return "ran"
+
+        @bulkheads.limit("sync")
+        async def light():
+            return "ran"
+
+        holder = asyncio.create_task(heavy())
+        await started.wait()
+        assert await light() == "ran"
+        results = await asyncio.gather(other_heavy(), return_exceptions=True)
+        assert results[0].status_code == 503
+        release.set()
+        await holder
+        assert await other_heavy() == "ran"
+
+    asyncio.run(run())
+
+
+def test_limit_decorator_keeps_the_endpoint_signature():
+    bulkheads = Bulkheads({"bulk": {"max_concurrent": 1}})
+
+    @bulkheads.limit("bulk")
+    async def endpoint(session_id: int, q: str = "x"):
+        return session_id, q
+
+    assert list(inspect.signature(endpoint).parameters) == ["session_id", "q"]
+    assert asyncio.run(endpoint(3)) == (3, "x")
+
+
+def test_limit_decorator_runs_under_the_rate_limiter():
+    app = FastAPI()
+    limiter = Limiter(key_func=get_remote_address)
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+    bulkheads = Bulkheads({
+        "open": {"max_concurrent": 1},
+        "closed": {"max_concurrent": 0, "retry_after": 7},
+    })
+
+    @app.get("/open/{item_id}")
+    @limiter.limit("2/minute")
+    @bulkheads.limit("open")
+    async def open_route(request: Request, item_id: int):
+        return {"item_id": item_id}
+
+    @app.get("/closed")
+    @limiter.limit("10/minute")
+    @bulkheads.limit("closed")
+    async def closed_route(request: Request):
+        return {}
+
+    with TestClient(app) as client:
+        assert client.get("/open/3").json() == {"item_id": 3}
+        assert client.get("/open/x").status_code == 422
+        assert client.get("/open/3").status_code == 200
+        assert client.get("/open/3").status_code == 429
+        response = client.get("/closed")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "7"
@@ -0,0 +1,97 @@
+import json
+import logging
+import queue
+
+import logging_setup
+from logging_setup import BatchWriter, DeferredQueueHandler, JsonLineFormatter, RouteSampler, _access_record
+
+
+def make_writer(path, queue_size=100):
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(JsonLineFormatter())
+    queue_handler = DeferredQueueHandler(queue.SimpleQueue(), queue_size)
+    return queue_handler, BatchWriter(queue_handler, handler)
+
+
+def record(message):
+    return logging.makeLogRecord({"name": "test", "levelno": logging.INFO, "levelname": "INFO", "msg": message})
+
+
+def read_messages(path):
+    with open(path, encoding="utf-8") as log:
+        return [json.loads(line)["message"] for line in log]
+
+
+def test_full_queue_drops_and_reports(tmp_path):
+    path = tmp_path / "log"
+    queue_handler, writer = make_writer(path, queue_size=2)
+    for index in range(5):
+        queue_handler.handle(record(f"record {index}"))
+    assert queue_handler.dropped == 3
+    writer.start()
+    writer.stop()
+    assert read_messages(path) == [
+        "record 0", "record 1", "3 log records dropped because the log queue was full",
+    ]
+
+
+def test_writer_survives_write_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging, "raiseExceptions", False)
+    path = tmp_path / "log"
+    queue_handler, writer = make_writer(path)
+    # Closing the underlying file makes the next write raise ValueError.
+    writer.handler.stream.close()
+    writer._write([record("lost")])
+    writer._write([record("kept")])
+    writer.start()
+    queue_handler.handle(record("after restart"))
+    writer.stop()
+    assert read_messages(path) == ["kept", "after restart"]
+
+
+def test_route_sampler_uses_longest_prefix_and_keeps_errors():
+    sampler = RouteSampler({"/items/": 0.0, "/items/int/": 1.0})
+    assert sampler.keep("/items/int/3", 200)
+    assert not sampler.keep("/items/multiplebodies/3", 200)
+    assert sampler.keep("/items/multiplebodies/3", 500)
+    assert sampler.keep("/users/me/", 200)
+
+
+def test_access_entries_are_formatted_on_the_writer(tmp_path):
+    path = tmp_path / "log"
+    queue_handler, writer = make_writer(path)
+    queue_handler.enqueue((0, "GET", "/users/me/", 200, 0.5))
+    writer.start()
+    writer.stop()
+    with open(path, encoding="utf-8") as log:
+        entry = json.loads(log.readline())
+    assert entry["message"] == "GET /users/me/ 200"
+    assert entry["logger"] == "api.access"
+    assert entry["duration"] == 0.5
+    assert _access_record((0, "GET", "/", 200, 0.1)).created == 0.0
+
+    path = tmp_path / "plain"
+    queue_handler, writer = make_writer(path)
+    writer.handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    queue_handler.enqueue((1_000_000_000_123_000_000, "GET", "/users/me/", 200, 0.5))
+    writer.start()
+    writer.stop()
+    with open(path, encoding="utf-8") as log:
+        line = log.readline()
+    assert line.split(" ", 2)[1].endswith(",123")
+    assert line.endswith("INFO api.access: GET /users/me/ 200\n")
+
+
+def test_server_errors_go_through_the_writer(tmp_path):
+    path = tmp_path / "log"
+    error_logger = logging.getLogger("uvicorn.error")
+    sync_handler = logging.StreamHandler()
+    error_logger.handlers = [sync_handler]
+    error_logger.propagate = False
+    logging_setup.setup_logging(log_file=str(path))
+    try:
+        assert error_logger.handlers == [logging_setup._queue_handler]
+        error_logger.error("Exception in ASGI application")
+    finally:
+        logging_setup.shutdown_logging()
+    assert read_messages(path) == ["Exception in ASGI application"]
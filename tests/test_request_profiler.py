@@ -0,0 +1,30 @@
+import request_profiler
+
+
+def test_profiles_of_the_same_route_do_not_overwrite_each_other(tmp_path):
+    names = []
+    for _ in range(3):
+        profiler = request_profiler.try_start(1000.0)
+        assert profiler is not None
+        names.append(request_profiler.finish(profiler, str(tmp_path), "POST", "/uploadfiles/"))
+    assert len(set(names)) == 3
+    assert len(request_profiler.list_profiles(str(tmp_path))) == 3
+
+
+def test_only_one_profile_runs_at_a_time(tmp_path):
+    profiler = request_profiler.try_start(1000.0)
+    try:
+        assert request_profiler.try_start(1000.0) is None
+    finally:
+        request_profiler.finish(profiler, str(tmp_path), "GET", "/")
+
+
+def test_sampling_rate_rejects_non_finite_and_clamps():
+    assert request_profiler.sampling_rate("nan", 200.0, 1000.0) == 200.0
+    assert request_profiler.sampling_rate("inf", 200.0, 1000.0) == 200.0
+    assert request_profiler.sampling_rate("-inf", 200.0, 1000.0) == 200.0
+    assert request_profiler.sampling_rate("fast", 200.0, 1000.0) == 200.0
+    assert request_profiler.sampling_rate(None, 200.0, 1000.0) == 200.0
+    assert request_profiler.sampling_rate("5000", 200.0, 1000.0) == 1000.0
+    assert request_profiler.sampling_rate("0", 200.0, 1000.0) == 1.0
+    assert request_profiler.sampling_rate("0.5", 200.0, 1000.0) == 1.0
@@ -0,0 +1,62 @@
+import pytest
+from fastapi import HTTPException
+
+from InternalCode.json_parser import SessionDelta
+from session_store import apply_delta, check_delta_order
+
+
+def position(t):
+    return {"t": t, "X": 0.0, "Y": 0.0, "Z": 0.0}
+
+
+def test_delta_continuing_the_streams_updates_the_last_timestamps():
+    delta = SessionDelta.parse_obj({
+        "CommonEvents": {"RegisterScore": [{"t": 12, "value": 1}]},
+        "TrackingRaw": {"Head": {"Position": [position(10), position(10), position(11)]}},
+    })
+    stored = {"CommonEvents/RegisterScore": 5, "TrackingRaw/Head": 10, "Kinematics/Hand": 7}
+    assert check_delta_order(stored, delta) == {
+        "CommonEvents/RegisterScore": 12, "TrackingRaw/Head": 11, "Kinematics/Hand": 7,
+    }
+
+
+def test_stream_going_backwards_is_rejected_with_422():
+    delta = SessionDelta.parse_obj({"TrackingRaw": {"Head": {"Position": [position(9)]}}})
+    with pytest.raises(HTTPException) as error:
+        check_delta_order({"TrackingRaw/Head": 10}, delta)
+    assert error.value.status_code == 422
+    assert "TrackingRaw/Head" in error.value.detail
+
+
+def test_out_of_order_entries_within_a_delta_are_rejected_with_422():
+    delta = SessionDelta.parse_obj({"Kinematics": {"Hand": {"Position": [position(3), position(2)]}}})
+    with pytest.raises(HTTPException) as error:
+        check_delta_order({}, delta)
+    assert error.value.status_code == 422
+
+
+def test_new_stream_key_is_accepted():
+    delta = SessionDelta.parse_obj({
+        "ObjectEvents": {"Cube": [{"t": 1, "id": 4, "X": 0.0, "Y": 0.0, "Z": 0.0}]},
+    })
+    assert check_delta_order({"TrackingRaw/Head": 10}, delta) == {"TrackingRaw/Head": 10, "ObjectEvents/Cube": 1}
+
+
+def test_apply_delta_extends_lists_and_replaces_scalar_events():
+    data = {
+        "CommonEvents": {"ProtocolStart": {"t": 0}, "ProtocolFinished": {"t": 0}, "ProtocolAborted": {},
+                         "ProtocolPaused": [], "RegisterScore": [{"t": 1, "value": 1}], "IrcComputeDifficulty": []},
+        "ObjectEvents": {},
+        "TrackingRaw": {"Head": {"Position": [position(1)]}},
+        "Kinematics": {},
+    }
+    delta = SessionDelta.parse_obj({
+        "CommonEvents": {"ProtocolFinished": {"t": 9}, "RegisterScore": [{"t": 2, "value": 3}]},
+        "TrackingRaw": {"Head": {"Position": [position(2)]}, "Hand": {"Position": [position(2)]}},
+    })
+    apply_delta(data, delta.dict())
+    assert data["CommonEvents"]["ProtocolStart"] == {"t": 0}
+    assert data["CommonEvents"]["ProtocolFinished"] == {"t": 9}
+    assert data["CommonEvents"]["RegisterScore"] == [{"t": 1, "value": 1}, {"t": 2, "value": 3}]
+    assert data["TrackingRaw"]["Head"]["Position"] == [position(1), position(2)]
+    assert data["TrackingRaw"]["Hand"]["Position"] == [position(2)]
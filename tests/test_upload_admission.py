@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import upload_admission
+from upload_admission import UploadMemoryBudget
+
+
+def make_budget(**kwargs):
+    options = {"budget": 100, "expansion_factor": 1.0, "max_queue": 2, "queue_timeout": 0.05}
+    options.update(kwargs)
+    return UploadMemoryBudget(**options)
+
+
+async def hold(budget, size, started, release):
+    async with budget.reserve(size):
+        started.set()
+        await release.wait()
+
+
+def test_grant_within_budget():
+    async def run():
+        budget = make_budget()
+        async with budget.reserve(60):
+            assert budget.reserved == 60
+        assert budget.reserved == 0
+
+    asyncio.run(run())
+
+
+def test_too_large_upload_is_rejected_with_413():
+    async def run():
+        budget = make_budget()
+        with pytest.raises(HTTPException) as error:
+            async with budget.reserve(101):
+                pass
+        assert error.value.status_code == 413
+        assert budget.reserved == 0
+
+    asyncio.run(run())
+
+
+def test_queued_upload_is_granted_on_release():
+    async def run():
+        budget = make_budget(queue_timeout=1.0)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(budget, 60, started, release))
+        await started.wait()
+
+        async def queued():
+            async with budget.reserve(60):
+                return budget.reserved
+
+        waiter = asyncio.create_task(queued())
+        await asyncio.sleep(0)
+        assert budget._queue.waiting == 1
+        release.set()
+        assert await waiter == 60
+        await holder
+        assert budget.reserved == 0
+        assert budget._queue.waiting == 0
+
+    asyncio.run(run())
+
+
+def test_concurrent_reservations_share_the_measured_growth(monkeypatch):
+    rss = [1000]
+    monkeypatch.setattr(upload_admission, "current_rss", lambda: rss[0])
+
+    async def run():
+        budget = make_budget()
+        async with budget.reserve(30) as first:
+            async with budget.reserve(30) as second:
+                assert budget.reserved == 60
+                # Both parses together grew the worker by 70 bytes.
+                rss[0] = 1070
+                first.sample()
+                second.sample()
+                await asyncio.sleep(0)
+                assert budget.reserved == 70
+            assert budget.reserved == 35
+        assert budget.reserved == 0
+        assert budget._overrun == 0
+
+    asyncio.run(run())